@@ -5,10 +5,262 @@ Uses Claude to analyze code and extract state machine patterns
 
 import os
 import re
+import json
+import struct
+import asyncio
+import hashlib
+import functools
+from array import array
+from collections.abc import Sequence
+import stat
+import mmap
+import shutil
+import fnmatch
 import subprocess
-import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from glob import glob as glob_sync
+from state_extractor import extract_state_machine
+
+# orjson serializes the prompt's file list much faster than json when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Full path of the Claude CLI, resolved once per process by claude_command().
+# Calls exec it directly with no shell; a resolved path is also what lets
+# Windows run the npm claude.cmd shim, which CreateProcess won't find by bare
+# name. It is filled on first use rather than at import, so runs answered from
+# the cache or the local fast path never search PATH
+_CLAUDE_BIN = None
+
+# Worker count for I/O-bound thread pools (stat/read calls release the GIL)
+_IO_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# Files larger than this are decoded straight from a memory map
+_MMAP_THRESHOLD = 64 * 1024
+
+# O_BINARY keeps Windows from applying text-mode translation to os.read
+_OPEN_FLAGS = os.O_RDONLY | getattr(os, 'O_BINARY', 0)
+
+# Bump when the prompt or result format changes so old cache entries are ignored
+_CACHE_VERSION = b'6'
+
+# Leading bytes inspected to decide whether a file is binary
+_SNIFF_SIZE = 512
+
+# Bytes expected in source files: printable ASCII, common whitespace/control
+# characters, and the high bytes that make up UTF-8 multibyte sequences
+_TEXT_BYTES = bytes({7, 8, 9, 10, 12, 13, 27} | set(range(0x20, 0x7f)) | set(range(0x80, 0x100)))
+
+
+def _glob_to_regex(pattern):
+    """Translate a gitignore-style glob into a regex over relative POSIX paths"""
+    parts = []
+    i, n = 0, len(pattern)
+    while i < n:
+        if pattern.startswith('**/', i):
+            parts.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('/**', i) and i + 3 == n:
+            parts.append('(?:/.*)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            parts.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            parts.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            parts.append('[^/]')
+            i += 1
+        elif pattern[i] == '[':
+            # Character class like [ch] or [!0-9]; an unclosed '[' is literal
+            j = i + 1
+            if j < n and pattern[j] in '!^':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            j = pattern.find(']', j)
+            if j < 0:
+                parts.append(re.escape('['))
+                i += 1
+                continue
+            content = pattern[i + 1:j]
+            negate = content[:1] in ('!', '^')
+            if negate:
+                content = content[1:]
+            content = ''.join('\\' + c if c in '\\[]^' else c for c in content)
+            # Like the other wildcards, a class never matches the separator
+            parts.append('[^/' + content + ']' if negate else '(?!/)[' + content + ']')
+            i = j + 1
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return ''.join(parts)
+
+
+def _compile_globs(patterns):
+    """Compile a list of globs into a single regex matched once per path"""
+    if not patterns:
+        return None
+    return re.compile('|'.join('(?:{})'.format(_glob_to_regex(p)) for p in patterns))
+
+
+# Markers used to pull the Mermaid diagram out of Claude's response
+_DIAGRAM_MARKER = 'stateDiagram-v2'
+_DIAGRAM_TERMINATORS = ('\n\n', '\n```')
+_MERMAID_FENCE = '```mermaid\n'
+
+# A Mermaid transition line, 'A --> B' or 'A --> B: label', as (from, to, label)
+_TRANSITION_LINE_RE = re.compile(r'(\S+)\s*-->\s*([^\s:]+)\s*(?::\s*(.*?))?\s*')
+
+# Placeholders in viewer-template.html, filled in a single substitution pass
+_TEMPLATE_PLACEHOLDER_RE = re.compile(r'\{\{(STYLES|SCRIPTS|MERMAID_DIAGRAM)\}\}')
+
+# Matches excludes of the form '**/<dirname>/**' that can prune by name alone
+_DIR_EXCLUDE_RE = re.compile(r'\*\*/([^/*?\[]+)/\*\*')
+
+
+def _split_dir_excludes(patterns):
+    """Separate plain directory-name excludes from patterns that need a regex
+
+    Returns (frozenset of directory names, list of remaining patterns).
+    """
+    names = set()
+    residual = []
+    for pattern in patterns:
+        match = _DIR_EXCLUDE_RE.fullmatch(pattern)
+        if match:
+            names.add(match.group(1))
+        else:
+            residual.append(pattern)
+    return frozenset(names), residual
+
+
+def _try_decompose_shallow(pattern):
+    """Split a '<prefix>/<wildcard>/<suffix>' pattern around its only wildcard segment
+
+    Returns (prefix, wildcard, suffix), or None if the pattern needs a full glob.
+    """
+    if '**' in pattern or any(c in pattern for c in '?[{'):
+        return None
+    segments = pattern.split('/')
+    wildcards = [i for i, segment in enumerate(segments) if '*' in segment]
+    if len(wildcards) != 1:
+        return None
+    i = wildcards[0]
+    return '/'.join(segments[:i]), segments[i], '/'.join(segments[i + 1:])
+
+
+def _looks_binary(head):
+    """Guess whether a file is binary from its first bytes, like git and ripgrep"""
+    if b'\0' in head:
+        return True
+    if not head:
+        return False
+    # More than 30% control bytes outside the usual whitespace means binary
+    return len(head.translate(None, _TEXT_BYTES)) / len(head) > 0.3
+
+
+def claude_command():
+    """Return the argv for a non-interactive Claude CLI call"""
+    global _CLAUDE_BIN
+    if _CLAUDE_BIN is None:
+        # A miss isn't cached, so installing the CLI mid-session still works
+        _CLAUDE_BIN = shutil.which('claude')
+    if _CLAUDE_BIN is None:
+        raise Exception('Claude CLI not found in PATH. Install it from '
+                        'https://claude.com/claude-code and check that `claude --version` works')
+    return [_CLAUDE_BIN, '--print']
+
+
+def _dump_json(value, ensure_ascii=False):
+    """Serialize to a compact JSON string, with orjson when it is available
+
+    ensure_ascii writes non-ASCII text as \\uXXXX escapes, which is also the
+    only way to serialize lone surrogates (e.g. from undecodable file names)
+    for the UTF-8 Claude CLI input; orjson can't, so the stdlib is used then.
+    """
+    if orjson is not None and not ensure_ascii:
+        try:
+            return orjson.dumps(value).decode('utf-8')
+        except TypeError:
+            ensure_ascii = True
+    return json.dumps(value, ensure_ascii=ensure_ascii, separators=(',', ':'))
+
+
+def _encodes_as_utf8(text):
+    """Check that a string holds no lone surrogates, so it can be sent as UTF-8"""
+    try:
+        text.encode('utf-8')
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+def _stat_or_none(path):
+    """Stat a path, returning None if it does not exist or is unreadable"""
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def _load_templates():
+    """Read the viewer template, CSS and JS once per process"""
+    # Get template directory relative to this file
+    template_dir = Path(__file__).parent / 'templates'
+    return (
+        (template_dir / 'viewer-template.html').read_text(encoding='utf-8'),
+        (template_dir / 'viewer.css').read_text(encoding='utf-8'),
+        (template_dir / 'viewer.js').read_text(encoding='utf-8'),
+    )
+
+
+class ScannedFiles(Sequence):
+    """Compact, read-only list of scanned file paths with their stat metadata
+
+    Paths are packed as filesystem-encoded bytes into one blob with an array
+    of offsets, and sizes/mtimes live in parallel arrays, instead of keeping a
+    str and a tuple per file. Indexing and iteration decode paths lazily, so
+    it can be used anywhere a list of path strings is expected.
+    """
+
+    def __init__(self):
+        self._blob = bytearray()
+        self._offsets = array('Q', [0])
+        self.sizes = array('q')
+        self.mtimes = array('q')
+
+    def append(self, path, st):
+        """Add a path with the os.stat_result (or DirEntry.stat()) from the scan"""
+        self._blob += os.fsencode(path)
+        self._offsets.append(len(self._blob))
+        self.sizes.append(st.st_size)
+        self.mtimes.append(st.st_mtime_ns)
+
+    def raw(self, index):
+        """Return the filesystem-encoded bytes of the path at index"""
+        return bytes(self._blob[self._offsets[index]:self._offsets[index + 1]])
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('ScannedFiles index out of range')
+        return os.fsdecode(self.raw(index))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield os.fsdecode(self.raw(index))
 
 
 class CodeToFSMAnalyzer:
@@ -23,60 +275,207 @@ class CodeToFSMAnalyzer:
                 '**/node_modules/**', '**/venv/**', '**/build/**', '**/.git/**',
                 '**/__pycache__/**', '**/*.pyc'
             ]),
-            'max_file_size': options.get('max_file_size', 100000)  # 100KB max per file
+            'max_file_size': options.get('max_file_size', 100000),  # 100KB max per file
+            # Source characters per Claude call; larger workspaces are split into
+            # chunks that are analyzed concurrently
+            'max_prompt_chars': options.get('max_prompt_chars', 400000),
+            'max_concurrent_calls': options.get('max_concurrent_calls', 4),
+            # Results are memoized here, keyed by the analyzed files' paths,
+            # sizes and mtimes; set use_cache to False to always call Claude
+            'cache_dir': options.get('cache_dir', os.path.join(
+                os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                'code-to-fsm'
+            )),
+            'use_cache': options.get('use_cache', True),
+            # Skip Claude when a local AST walk of the Python sources finds at
+            # least this many state writes guarded by a check of the current
+            # state. Other languages are only scanned with the regex
+            # heuristics once that threshold is met, and never count towards it
+            'local_fast_path': options.get('local_fast_path', True),
+            'min_local_transitions': options.get('min_local_transitions', 3)
         }
+        self._exclude_re = _compile_globs(self.options['exclude_patterns'])
+        # During the tree walk, directory-name excludes prune subtrees with a set
+        # lookup; only the remaining patterns need the regex
+        self._pruned_dirs, walk_excludes = _split_dir_excludes(self.options['exclude_patterns'])
+        self._walk_exclude_re = _compile_globs(walk_excludes)
+
+    def _is_excluded(self, relative_path):
+        """Check a workspace-relative POSIX path against the exclude patterns"""
+        return self._exclude_re is not None and self._exclude_re.fullmatch(relative_path) is not None
 
     def scan_workspace(self):
-        """Scan the workspace for relevant files"""
-        files = []
+        """Scan the workspace for relevant files
+
+        Returns a ScannedFiles sequence of path strings that also carries the
+        size and mtime of each file, so later steps don't stat them again.
+        """
+        files = ScannedFiles()
         workspace = Path(self.workspace_path)
+        max_size = self.options['max_file_size']
+        candidates = []
+        general_patterns = []
 
         for pattern in self.options['file_patterns']:
-            matches = workspace.glob(pattern)
-            for match in matches:
-                # Check if file should be excluded
-                should_exclude = False
-                for exclude_pattern in self.options['exclude_patterns']:
-                    exclude_glob = exclude_pattern.replace('**/', '')
-                    if exclude_glob in str(match):
-                        should_exclude = True
-                        break
-
-                if not should_exclude and match.is_file():
+            if not any(c in pattern for c in '*?[{'):
+                # Invariant pattern: a single stat is enough
+                candidates.append(workspace / pattern)
+                continue
+
+            shallow = _try_decompose_shallow(pattern)
+            if shallow:
+                candidates.extend(self._expand_shallow(workspace, *shallow))
+            else:
+                general_patterns.append(pattern)
+
+        # Drop duplicates (a file may match several patterns) and excluded paths.
+        # Workspace-relative POSIX paths are the key, as the walk below yields
+        # them too, whether or not the workspace path is normalized
+        seen = set()
+        unique = []
+        for candidate in candidates:
+            relative_path = candidate.relative_to(workspace).as_posix()
+            if relative_path in seen:
+                continue
+            seen.add(relative_path)
+            if not self._is_excluded(relative_path):
+                unique.append(candidate)
+
+        # Stat candidates in parallel so slow directories don't serialize the scan
+        with ThreadPoolExecutor(max_workers=_IO_WORKERS) as executor:
+            for candidate, st in zip(unique, executor.map(_stat_or_none, unique)):
+                if st is not None and stat.S_ISREG(st.st_mode):
                     # Check file size
-                    if match.stat().st_size <= self.options['max_file_size']:
-                        files.append(str(match))
+                    if st.st_size <= max_size:
+                        files.append(str(candidate), st)
+
+        # All remaining patterns share a single walk of the tree
+        general_re = _compile_globs(general_patterns)
+        if general_re is not None:
+            # Only the few invariant/shallow matches need remembering; the walk
+            # itself yields each file once, so its paths never become a set
+            for entry, relative_path in self._walk_files(workspace):
+                if relative_path in seen or not general_re.fullmatch(relative_path):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                if st.st_size <= max_size:
+                    files.append(entry.path, st)
 
         return files
 
+    def _walk_files(self, workspace):
+        """Yield (DirEntry, relative POSIX path) for every non-excluded file
+
+        Excluded directories are pruned before descending, and the cached
+        dirent type avoids a stat call per entry on most platforms; only
+        symlinks cost a stat. Symlinked files are included, as with Path.glob,
+        but symlinked directories are not descended into.
+        """
+        pruned_dirs = self._pruned_dirs
+        exclude_re = self._walk_exclude_re
+        stack = [(str(workspace), '')]
+        while stack:
+            directory, relative_dir = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    entries = list(entries)
+            except OSError:
+                continue
+
+            for entry in entries:
+                relative_path = relative_dir + entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name in pruned_dirs:
+                            continue
+                        if exclude_re is None or not exclude_re.fullmatch(relative_path):
+                            stack.append((entry.path, relative_path + '/'))
+                    elif entry.is_file():
+                        if exclude_re is None or not exclude_re.fullmatch(relative_path):
+                            yield entry, relative_path
+                except OSError:
+                    continue
+
+    def _expand_shallow(self, workspace, prefix, wildcard, suffix):
+        """List candidates for a single-wildcard pattern with one scandir call"""
+        base = workspace / prefix if prefix else workspace
+        try:
+            with os.scandir(base) as entries:
+                names = [entry.name for entry in entries if fnmatch.fnmatch(entry.name, wildcard)]
+        except OSError:
+            return []
+
+        if suffix:
+            return [base / name / suffix for name in names]
+        return [base / name for name in names]
+
     def read_files(self, file_paths):
         """Read and prepare file contents for analysis"""
-        file_contents = []
-
-        for file_path in file_paths:
+        # File reads release the GIL, so a thread pool overlaps their latency;
+        # map() keeps the results in the same order as file_paths
+        with ThreadPoolExecutor(max_workers=_IO_WORKERS) as executor:
+            if isinstance(file_paths, ScannedFiles):
+                results = executor.map(self._read_one, file_paths, file_paths.sizes)
+            else:
+                results = executor.map(self._read_one, file_paths)
+            return [file for file in results if file is not None]
+
+    def _read_one(self, file_path, size=None):
+        """Read a single file, returning None if it is binary or can't be read
+
+        size is the st_size from the scan, if known. It is only a hint to
+        size the reads, since the file may have changed since it was scanned.
+        """
+        try:
+            fd = os.open(file_path, _OPEN_FLAGS)
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    relative_path = os.path.relpath(file_path, self.workspace_path)
-                    file_contents.append({
-                        'path': relative_path,
-                        'content': content
-                    })
-            except Exception as error:
-                print(f'Warning: Could not read {file_path}: {error}')
-
-        return file_contents
+                # A mapping must match the file's current size, so check the
+                # open fd rather than trusting the scanned size
+                if size is None or size > _MMAP_THRESHOLD:
+                    size = os.fstat(fd).st_size
+                # Sniff the head before paying for the full read and decode
+                if size > _MMAP_THRESHOLD:
+                    with mmap.mmap(fd, size, access=mmap.ACCESS_READ) as mapped:
+                        if _looks_binary(mapped[:_SNIFF_SIZE]):
+                            return None
+                        content = str(mapped, 'utf-8', 'replace')
+                else:
+                    head = os.read(fd, _SNIFF_SIZE)
+                    if _looks_binary(head):
+                        return None
+                    # Read until EOF so a file that grew since the scan isn't truncated
+                    chunks = [head]
+                    remaining = size - len(head)
+                    while head:
+                        head = os.read(fd, max(remaining, _SNIFF_SIZE))
+                        chunks.append(head)
+                        remaining -= len(head)
+                    content = b''.join(chunks).decode('utf-8', errors='replace')
+            finally:
+                os.close(fd)
+            return {
+                'path': os.path.relpath(file_path, self.workspace_path),
+                'content': content
+            }
+        except Exception as error:
+            print(f'Warning: Could not read {file_path}: {error}')
+            return None
 
     def create_analysis_prompt(self, files, focus_area=None):
         """Create analysis prompt for Claude"""
-        files_summary = '\n---\n\n'.join([
-            f'File: {f["path"]}\n```\n{f["content"]}\n```\n'
-            for f in files
-        ])
+        # A single JSON array is serialized in one C-level pass and gives each
+        # file's path and content unambiguous boundaries
+        # Contents are decoded with errors='replace', so only paths can carry
+        # lone surrogates; checking them avoids re-encoding the whole prompt
+        files_summary = _dump_json([{'path': f['path'], 'content': f['content']} for f in files],
+                                   ensure_ascii=not all(_encodes_as_utf8(f['path']) for f in files))
 
         prompt = f"""You are analyzing a codebase to extract state machine patterns.
 
-Here are the relevant files from the project:
+Here are the relevant files from the project, as a JSON array of objects with "path" and "content" fields:
 
 {files_summary}
 
@@ -123,49 +522,162 @@ stateDiagram-v2
         """Call Claude CLI to analyze the code"""
         print('🖥️  Using Claude CLI...')
 
-        # Write prompt to temp file to avoid command line length limits
-        with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.txt', encoding='utf-8') as f:
-            f.write(prompt)
-            tmp_file = f.name
-
-        try:
-            # Use shell redirection to read from temp file
-            result = subprocess.run(
-                'claude --print < "{}"'.format(tmp_file),
-                shell=True,
-                capture_output=True,
-                text=True,
-                encoding='utf-8'
+        # Pipe the prompt over stdin: no temp file, no shell, and no command
+        # line length limits
+        result = subprocess.run(
+            claude_command(),
+            input=prompt,
+            capture_output=True,
+            text=True,
+            encoding='utf-8'
+        )
+
+        if result.returncode != 0:
+            raise Exception(f'Claude CLI exited with code {result.returncode}: {result.stderr}')
+
+        return result.stdout.strip()
+
+    async def _analyze_chunk_async(self, contents, paths, focus_area, limit):
+        """Call Claude CLI for one chunk without blocking the event loop
+
+        The chunk's prompt is only built once a concurrency slot is free, from
+        the shared path -> content mapping, so at most max_concurrent_calls
+        prompts exist at a time.
+        """
+        async with limit:
+            prompt = self.create_analysis_prompt(
+                [{'path': path, 'content': contents[path]} for path in paths], focus_area
+            ).encode('utf-8')
+            process = await asyncio.create_subprocess_exec(
+                *claude_command(),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
             )
-
-            if result.returncode != 0:
-                raise Exception(f'Claude CLI exited with code {result.returncode}: {result.stderr}')
-
-            return result.stdout.strip()
-
-        finally:
-            # Clean up temp file
             try:
-                os.unlink(tmp_file)
-            except:
-                pass
+                stdout, stderr = await process.communicate(prompt)
+            finally:
+                # A cancelled call must not leave its claude process running
+                if process.returncode is None:
+                    try:
+                        process.kill()
+                    except ProcessLookupError:
+                        pass
+                    await process.wait()
+
+        if process.returncode != 0:
+            raise Exception(f'Claude CLI exited with code {process.returncode}: '
+                            f'{stderr.decode("utf-8", errors="replace")}')
+
+        return stdout.decode('utf-8', errors='replace').strip()
+
+    async def _analyze_chunks_async(self, contents, chunks, focus_area):
+        """Run one Claude CLI call per chunk, at most max_concurrent_calls at a time
+
+        Returns the responses of the chunks that succeeded; a failed chunk is
+        reported and skipped, and only when every chunk fails is its error raised.
+        """
+        # Created here so it binds to the running event loop on Python < 3.10
+        limit = asyncio.Semaphore(self.options['max_concurrent_calls'])
+        results = await asyncio.gather(*(
+            self._analyze_chunk_async(contents, paths, focus_area, limit) for paths in chunks
+        ), return_exceptions=True)
+
+        responses = []
+        for i, result in enumerate(results, 1):
+            if not isinstance(result, BaseException):
+                responses.append(result)
+            elif isinstance(result, Exception):
+                print(f'Warning: Chunk {i} of {len(results)} failed: {result}')
+            else:
+                raise result
+        if not responses:
+            raise results[0]
+        return responses
+
+    def _chunk_files(self, files):
+        """Partition files into chunks of paths that fit the per-call prompt budget"""
+        budget = self.options['max_prompt_chars']
+        chunks = []
+        current = []
+        current_size = 0
+
+        for f in files:
+            size = len(f['path']) + len(f['content'])
+            if current and current_size + size > budget:
+                chunks.append(current)
+                current = []
+                current_size = 0
+            current.append(f['path'])
+            current_size += size
+
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _merge_diagrams(self, responses):
+        """Extract the diagram from each chunk response and union them"""
+        diagrams = []
+        for response in responses:
+            try:
+                diagrams.append(self.extract_mermaid_diagram(response))
+            except Exception:
+                continue
+
+        if not diagrams:
+            raise Exception('Could not extract Mermaid diagram from response')
+        if len(diagrams) == 1:
+            return diagrams[0]
+
+        # Keep one header and drop top-level transitions reported by more than
+        # one chunk; composite states, notes and separators pass through as-is
+        lines = ['stateDiagram-v2']
+        seen = set()
+        for diagram in diagrams:
+            depth = 0
+            in_note = False
+            for line in diagram.splitlines():
+                stripped = line.strip()
+                if not stripped or (depth == 0 and not in_note and stripped == 'stateDiagram-v2'):
+                    continue
+
+                if in_note:
+                    in_note = stripped != 'end note'
+                elif stripped.startswith('note ') and ':' not in stripped:
+                    in_note = True
+                elif stripped.endswith('{'):
+                    depth += 1
+                elif stripped == '}':
+                    depth = max(depth - 1, 0)
+                elif depth == 0:
+                    transition = _TRANSITION_LINE_RE.fullmatch(stripped)
+                    if transition:
+                        if transition.groups() in seen:
+                            continue
+                        seen.add(transition.groups())
+                lines.append(line)
+        return '\n'.join(lines)
 
     def extract_mermaid_diagram(self, response):
         """Extract Mermaid diagram from Claude's response"""
-        # Look for stateDiagram-v2 block
-        diagram_match = re.search(r'stateDiagram-v2[\s\S]*?(?=\n\n|\n```|$)', response)
-
-        if diagram_match:
-            return diagram_match.group(0).strip()
+        # Look for stateDiagram-v2 block, ending at a blank line or closing fence.
+        # Plain str.find is a fast substring search, so no regex is needed
+        start = response.find(_DIAGRAM_MARKER)
+        if start >= 0:
+            end = len(response)
+            for terminator in _DIAGRAM_TERMINATORS:
+                pos = response.find(terminator, start, end)
+                if pos >= 0:
+                    end = pos
+            return response[start:end].strip()
 
         # Fallback: look for anything between ```mermaid and ```
-        code_block_match = re.search(r'```mermaid\n([\s\S]*?)```', response)
-        if code_block_match:
-            return code_block_match.group(1).strip()
-
-        # Last resort: return the whole response if it looks like a diagram
-        if 'stateDiagram-v2' in response:
-            return response
+        start = response.find(_MERMAID_FENCE)
+        if start >= 0:
+            start += len(_MERMAID_FENCE)
+            end = response.find('```', start)
+            if end >= 0:
+                return response[start:end].strip()
 
         raise Exception('Could not extract Mermaid diagram from response')
 
@@ -183,77 +695,161 @@ stateDiagram-v2
         if len(file_paths) == 0:
             raise Exception('No files found to analyze')
 
+        cache_path = None
+        if self.options['use_cache']:
+            cache_path = os.path.join(self.options['cache_dir'],
+                                      self._cache_key(file_paths, focus_area) + '.json')
+            cached = self._load_cached_results(cache_path)
+            if cached:
+                print(f'♻️  Files unchanged since last run, using cached analysis: {cache_path}')
+                return cached
+
         print('📖 Reading file contents...')
         files = self.read_files(file_paths)
 
-        print('🤖 Calling Claude to analyze state machine patterns...')
-        prompt = self.create_analysis_prompt(files, focus_area)
-        response = self.analyze_with_claude(prompt)
+        # Common Python patterns can be extracted locally in milliseconds; a
+        # focus area needs Claude's judgement, so it always goes to Claude
+        local = None
+        if self.options['local_fast_path'] and not focus_area:
+            local = extract_state_machine(files, self.options['min_local_transitions'])
+
+        if local:
+            print(f'⚡ Found {local["transitions"]} transitions with local static analysis, skipping Claude')
+            response = (f'Extracted locally from source: {len(local["states"])} states '
+                        f'and {local["transitions"]} transitions.\n\n{local["diagram"]}')
+            responses = [response]
+        else:
+            print('🤖 Calling Claude to analyze state machine patterns...')
+            responses, response = self._analyze_with_chunks(files, focus_area)
 
         print('✅ Analysis complete!')
         print('\n' + '=' * 60)
-        print('CLAUDE\'S ANALYSIS:')
+        print('LOCAL ANALYSIS:' if local else 'CLAUDE\'S ANALYSIS:')
         print('=' * 60 + '\n')
         print(response)
         print('\n' + '=' * 60 + '\n')
 
-        mermaid_diagram = self.extract_mermaid_diagram(response)
+        mermaid_diagram = local['diagram'] if local else self._merge_diagrams(responses)
 
-        return {
+        results = {
             'analysis': response,
             'mermaid_diagram': mermaid_diagram,
             'files_analyzed': [f['path'] for f in files]
         }
+        if cache_path:
+            self._store_cached_results(cache_path, results)
+        return results
+
+    def _analyze_with_chunks(self, files, focus_area):
+        """Send files to Claude, one concurrent call per chunk if they don't fit in one
+
+        Returns (per-chunk responses, combined response text).
+        """
+        chunks = self._chunk_files(files)
+        if len(chunks) > 1:
+            print(f'🧩 Splitting into {len(chunks)} chunks analyzed concurrently...')
+            # Each file's content is stored once and looked up by path when a
+            # chunk's prompt is built, instead of materializing every prompt up front
+            contents = {f['path']: f['content'] for f in files}
+            responses = asyncio.run(self._analyze_chunks_async(contents, chunks, focus_area))
+            response = '\n\n'.join(
+                f'--- Part {i} of {len(responses)} ---\n{part}'
+                for i, part in enumerate(responses, 1)
+            )
+        else:
+            prompt = self.create_analysis_prompt(files, focus_area)
+            response = self.analyze_with_claude(prompt)
+            responses = [response]
+        return responses, response
+
+    def _cache_key(self, file_paths, focus_area):
+        """Hash the inputs that determine an analysis result"""
+        key = hashlib.blake2b(digest_size=16)
+        key.update(_CACHE_VERSION)
+        key.update((focus_area or '').encode('utf-8'))
+        key.update(struct.pack('<qqq', self.options['max_prompt_chars'],
+                               bool(self.options['local_fast_path']),
+                               self.options['min_local_transitions']))
+
+        if isinstance(file_paths, ScannedFiles):
+            entries = [(file_paths.raw(i), file_paths.sizes[i], file_paths.mtimes[i])
+                       for i in range(len(file_paths))]
+        else:
+            entries = []
+            for path in file_paths:
+                st = _stat_or_none(path)
+                entries.append((os.fsencode(path), st.st_size if st else -1, st.st_mtime_ns if st else -1))
+
+        for raw_path, size, mtime_ns in sorted(entries):
+            key.update(b'\0')
+            key.update(raw_path)
+            key.update(struct.pack('<qq', size, mtime_ns))
+
+        return key.hexdigest()
+
+    def _load_cached_results(self, cache_path):
+        """Return previously saved results, or None on a miss"""
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _store_cached_results(self, cache_path, results):
+        """Save results for reuse; caching is best-effort and never fails the run"""
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            tmp_path = cache_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(results, f)
+            os.replace(tmp_path, cache_path)
+        except OSError as error:
+            print(f'Warning: Could not write cache {cache_path}: {error}')
 
     def generate_html_viewer(self, mermaid_diagram, output_dir):
         """Generate HTML viewer for the diagram"""
-        # Get template directory relative to this file
-        template_dir = Path(__file__).parent / 'templates'
-
-        # Read template files
-        with open(template_dir / 'viewer-template.html', 'r', encoding='utf-8') as f:
-            html = f.read()
-        with open(template_dir / 'viewer.css', 'r', encoding='utf-8') as f:
-            css = f.read()
-        with open(template_dir / 'viewer.js', 'r', encoding='utf-8') as f:
-            js = f.read()
+        html, css, js = _load_templates()
 
         # Inject CSS, JavaScript, and mermaid diagram into HTML
-        html = html.replace('{{STYLES}}', css)
-        html = html.replace('{{SCRIPTS}}', js)
-        html = html.replace('{{MERMAID_DIAGRAM}}', mermaid_diagram)
+        # A single pass also keeps placeholder-like text inside the injected CSS,
+        # JS or diagram from being expanded again
+        values = {'STYLES': css, 'SCRIPTS': js, 'MERMAID_DIAGRAM': mermaid_diagram}
+        html = _TEMPLATE_PLACEHOLDER_RE.sub(lambda m: values[m.group(1)], html)
 
         # Write the combined HTML file
-        html_path = os.path.join(output_dir, 'view-diagram.html')
-        with open(html_path, 'w', encoding='utf-8') as f:
-            f.write(html)
+        html_path = Path(output_dir) / 'view-diagram.html'
+        html_path.write_text(html, encoding='utf-8')
 
-        return html_path
+        return str(html_path)
 
     def save_results(self, results, output_dir):
         """Save results to files"""
-        os.makedirs(output_dir, exist_ok=True)
-
-        # Save Mermaid diagram
-        mermaid_path = os.path.join(output_dir, 'state-machine.mmd')
-        with open(mermaid_path, 'w', encoding='utf-8') as f:
-            f.write(results['mermaid_diagram'])
-        print(f'💾 Mermaid diagram saved to: {mermaid_path}')
-
-        # Save full analysis
-        analysis_path = os.path.join(output_dir, 'analysis.txt')
-        full_analysis = f'Files Analyzed:\n' + '\n'.join(results['files_analyzed']) + '\n\n'
-        full_analysis += f'Analysis:\n{results["analysis"]}'
-        with open(analysis_path, 'w', encoding='utf-8') as f:
-            f.write(full_analysis)
-        print(f'💾 Full analysis saved to: {analysis_path}')
-
-        # Generate HTML viewer
-        html_path = self.generate_html_viewer(results['mermaid_diagram'], output_dir)
-        print(f'🌐 HTML viewer saved to: {html_path}')
+        out = Path(output_dir)
+        out.mkdir(parents=True, exist_ok=True)
+
+        mermaid_path = out / 'state-machine.mmd'
+        analysis_path = out / 'analysis.txt'
+        full_analysis = '\n'.join([
+            'Files Analyzed:', *results['files_analyzed'], '', f'Analysis:\n{results["analysis"]}'
+        ])
+
+        # The three outputs are independent, so write them concurrently
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            mermaid_write = executor.submit(mermaid_path.write_text, results['mermaid_diagram'], encoding='utf-8')
+            # File names that weren't valid UTF-8 are written back as their original bytes
+            analysis_write = executor.submit(analysis_path.write_text, full_analysis,
+                                             encoding='utf-8', errors='surrogateescape')
+            html_write = executor.submit(self.generate_html_viewer, results['mermaid_diagram'], output_dir)
+
+            mermaid_write.result()
+            print(f'💾 Mermaid diagram saved to: {mermaid_path}')
+            analysis_write.result()
+            print(f'💾 Full analysis saved to: {analysis_path}')
+            html_path = html_write.result()
+            print(f'🌐 HTML viewer saved to: {html_path}')
 
         return {
-            'mermaid_path': mermaid_path,
-            'analysis_path': analysis_path,
+            'mermaid_path': str(mermaid_path),
+            'analysis_path': str(analysis_path),
             'html_path': html_path
         }
@@ -9,7 +9,7 @@ import sys
 import os
 import argparse
 from pathlib import Path
-from analyzer import CodeToFSMAnalyzer
+from analyzer import CodeToFSMAnalyzer, claude_command
 
 # Fix Windows console encoding issues
 if sys.platform == 'win32':
@@ -32,6 +32,8 @@ def main():
     analyze_parser.add_argument('-f', '--files', nargs='+', help='Specific files to analyze (relative to workspace)')
     analyze_parser.add_argument('-p', '--patterns', nargs='+', help='File patterns to match (e.g., "*.py" "*.js")')
     analyze_parser.add_argument('--focus', help='Focus area or component to analyze (e.g., "robot controller")')
+    analyze_parser.add_argument('--always-claude', action='store_true', help='Ask Claude even when the state machine can be extracted locally')
+    analyze_parser.add_argument('--no-cache', action='store_true', help='Always call Claude, even if the files are unchanged since the last run')
 
     # Interactive command
     interactive_parser = subparsers.add_parser('interactive', help='Interactive mode - chat with Claude about your state machine using Claude CLI')
@@ -66,6 +68,10 @@ def run_analyze(args):
         analyzer_options = {}
         if args.patterns:
             analyzer_options['file_patterns'] = args.patterns
+        if args.always_claude:
+            analyzer_options['local_fast_path'] = False
+        if args.no_cache:
+            analyzer_options['use_cache'] = False
 
         analyzer = CodeToFSMAnalyzer(str(workspace_path), analyzer_options)
         results = analyzer.analyze(args.focus, args.files)
@@ -149,27 +155,20 @@ Please help the user understand the state machine logic in this code."""
                 for msg in conversation_history
             ])
 
-            # Call Claude CLI
+            # Call Claude CLI, piping the prompt over stdin
             import subprocess
-            import tempfile
-
-            with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.txt') as f:
-                f.write(prompt)
-                temp_file = f.name
-
-            try:
-                result = subprocess.run(
-                    ['claude', '--print'],
-                    stdin=open(temp_file, 'r'),
-                    capture_output=True,
-                    text=True,
-                    check=True
-                )
-                assistant_message = result.stdout.strip()
-                conversation_history.append({"role": "assistant", "content": assistant_message})
-                print(f'Claude: {assistant_message}\n')
-            finally:
-                os.unlink(temp_file)
+
+            result = subprocess.run(
+                claude_command(),
+                input=prompt,
+                capture_output=True,
+                text=True,
+                encoding='utf-8',
+                check=True
+            )
+            assistant_message = result.stdout.strip()
+            conversation_history.append({"role": "assistant", "content": assistant_message})
+            print(f'Claude: {assistant_message}\n')
 
         except KeyboardInterrupt:
             print('\n👋 Goodbye!')
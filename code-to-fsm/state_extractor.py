@@ -0,0 +1,492 @@
+"""
+State Extractor
+Detects common state machine patterns locally, without calling Claude
+"""
+
+import ast
+import re
+import warnings
+
+# Use RE2 (linear-time, DFA-based) for the multi-pattern scan when installed
+try:
+    import re2 as _re
+except ImportError:
+    _re = re
+
+# Variables and attributes treated as holding the current state
+STATE_VARIABLES = {'state', '_state', 'current_state', '_current_state'}
+
+# Functions/methods whose first argument is the next state
+TRANSITION_FUNCTIONS = {'transition_to', '_transition_to', 'set_state', '_set_state', 'change_state'}
+
+# Base classes that mark a class as an enumeration of states
+ENUM_BASES = {'Enum', 'IntEnum', 'StrEnum', 'Flag', 'IntFlag'}
+
+# Heuristics for languages without an AST walk (C, C++, JS/TS, Java). They are
+# combined into one alternation so each file is scanned in a single pass; the
+# syntax is limited to what both re and RE2 accept (no lookaround). Braces are
+# matched too, so case labels and if-guards only apply within their own block
+_QUALIFIER = r'(?:\w+(?:\.|::))*'
+_STATE_VALUE = r'(?:' + _QUALIFIER + r'(?P<{0}>\w+)|["\'](?P<{0}_str>[^"\'\n]+)["\'])'
+_STATE_FIELD = r'(?:this\.|this->|self->)?(?:state|currentState|current_state|_state|m_state)'
+_HEURISTIC_PATTERNS = [
+    r'\benum\s+(?:class\s+)?(?P<enum>\w*State\w*)\s*(?::\s*\w+\s*)?\{(?P<members>[^}]*)\}',
+    r'(?P<state_switch>\bswitch\s*\(\s*' + _STATE_FIELD + r'\s*\)\s*\{)',
+    r'(?P<other_switch>\bswitch\s*\([^)]*\)\s*\{)',
+    r'\bcase\s+' + _STATE_VALUE.format('case') + r'\s*:',
+    r'\bif\s*\(\s*' + _STATE_FIELD + r'\s*===?\s*' + _STATE_VALUE.format('guard'),
+    r'\b' + _STATE_FIELD + r'\s*=\s*' + _STATE_VALUE.format('assign'),
+    r'\b(?:transitionTo|transition_to|setState|set_state|changeState)\s*\(\s*' + _STATE_VALUE.format('call'),
+    r'(?P<open>\{)',
+    r'(?P<close>\})',
+]
+_HEURISTIC_RE = _re.compile('|'.join(_HEURISTIC_PATTERNS))
+
+# Bare identifiers only count as states when capitalized (IDLE, Idle), which
+# filters out values like null, true or new
+_STATE_IDENTIFIER = re.compile(r'[A-Z]\w*')
+
+# Key of the machine formed by module-level state variables
+_MODULE = ''
+
+# Characters Mermaid does not accept in a state id
+_INVALID_ID_CHARS = re.compile(r'\W+')
+
+
+def _name_of(node):
+    """Return the trailing name of a Name/Attribute node, or None"""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    return None
+
+
+def _string_value(node):
+    """Return the value of a string literal node (Python 3.7 uses ast.Str)"""
+    if type(node).__name__ == 'Constant' and isinstance(getattr(node, 'value', None), str):
+        return node.value
+    if type(node).__name__ == 'Str':
+        return node.s
+    return None
+
+
+def _collect_state_classes(tree, state_classes):
+    """Record classes that enumerate states: Enum subclasses and *State classes
+
+    Plain (non-Enum) classes only count when their members are string literals,
+    e.g. ``class RobotState: IDLE = "idle"``.
+    """
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.ClassDef):
+            continue
+        is_enum = any(_name_of(base) in ENUM_BASES for base in node.bases)
+        if not is_enum and not node.name.endswith(('State', 'States')):
+            continue
+
+        members = []
+        for statement in node.body:
+            if isinstance(statement, ast.Assign):
+                targets, value = statement.targets, statement.value
+            elif isinstance(statement, ast.AnnAssign) and statement.value is not None:
+                targets, value = [statement.target], statement.value
+            else:
+                continue
+            if not is_enum and _string_value(value) is None:
+                continue
+            members.extend(t.id for t in targets if isinstance(t, ast.Name) and not t.id.startswith('_'))
+
+        if members:
+            state_classes[node.name] = set(members)
+
+
+class _TransitionVisitor(ast.NodeVisitor):
+    """Walk a module collecting state assignments and the guards around them
+
+    Every class whose methods write ``self.state`` (or another name in
+    STATE_VARIABLES) is its own machine, keyed by the class name. Module-level
+    state variables, including ones written through ``global``, form the
+    module's machine, keyed by _MODULE. Function locals are never states.
+    """
+
+    def __init__(self, state_classes):
+        self.state_classes = state_classes
+        # Machine key -> {'initial', 'transitions', 'mentioned'}, where each
+        # transition is (sources, label, target) and sources is None (any
+        # state), ('in', names) or ('not', names)
+        self.machines = {}
+        self._class = None
+        self._function = None
+        self._globals = frozenset()
+        # Innermost entry maps each machine to the states the code can be in
+        # at this point
+        self._context = [{}]
+
+    def _machine(self, key):
+        return self.machines.setdefault(key, {'initial': None, 'transitions': [], 'mentioned': set()})
+
+    def _machine_of(self, node):
+        """Return the key of the machine whose state a node reads or writes, or None"""
+        if isinstance(node, ast.Attribute):
+            if (node.attr in STATE_VARIABLES and self._class is not None and self._function is not None
+                    and isinstance(node.value, ast.Name) and node.value.id == 'self'):
+                return self._class
+        elif isinstance(node, ast.Name) and node.id in STATE_VARIABLES:
+            if self._function is None:
+                # A class attribute is that class's default state
+                return self._class if self._class is not None else _MODULE
+            if node.id in self._globals:
+                return _MODULE
+        return None
+
+    def _state_value(self, node):
+        """Resolve a state literal (RobotState.IDLE, State.X, "idle") to a name"""
+        if isinstance(node, ast.Attribute) and isinstance(node.value, (ast.Name, ast.Attribute)):
+            if _name_of(node.value) in self.state_classes:
+                return node.attr
+        return _string_value(node)
+
+    def _guard_from_test(self, test):
+        """Turn an if-test on a state into (machine key, source guard), or None"""
+        if isinstance(test, ast.BoolOp) and isinstance(test.op, ast.Or):
+            machine = None
+            names = set()
+            for value in test.values:
+                guard = self._guard_from_test(value)
+                if guard is None or guard[1][0] != 'in' or machine not in (None, guard[0]):
+                    return None
+                machine = guard[0]
+                names |= guard[1][1]
+            return machine, ('in', names)
+
+        if not isinstance(test, ast.Compare) or len(test.ops) != 1:
+            return None
+        left, op, right = test.left, test.ops[0], test.comparators[0]
+        machine = self._machine_of(left)
+        if machine is None:
+            if isinstance(op, (ast.Eq, ast.NotEq, ast.Is, ast.IsNot)):
+                machine = self._machine_of(right)
+            if machine is None:
+                return None
+            left, right = right, left
+
+        if isinstance(op, (ast.In, ast.NotIn)) and isinstance(right, (ast.List, ast.Tuple, ast.Set)):
+            names = {self._state_value(element) for element in right.elts}
+        elif isinstance(op, (ast.Eq, ast.NotEq, ast.Is, ast.IsNot)):
+            names = {self._state_value(right)}
+        else:
+            return None
+
+        if None in names:
+            return None
+        self._machine(machine)['mentioned'].update(names)
+        return machine, ('in' if isinstance(op, (ast.Eq, ast.Is, ast.In)) else 'not', names)
+
+    def _record(self, machine, target_node):
+        target = self._state_value(target_node)
+        if target is None:
+            return
+        record = self._machine(machine)
+        record['mentioned'].add(target)
+
+        sources = self._context[-1].get(machine)
+        if sources is None and self._function in (None, '__init__'):
+            record['initial'] = record['initial'] or target
+        else:
+            record['transitions'].append((sources, self._function, target))
+        # Later assignments in the same block start from this state
+        self._context[-1][machine] = ('in', {target})
+
+    def visit_ClassDef(self, node):
+        outer = self._class, self._function, self._context
+        self._class, self._function, self._context = node.name, None, [{}]
+        self.generic_visit(node)
+        self._class, self._function, self._context = outer
+
+    def visit_FunctionDef(self, node):
+        outer = self._function, self._globals, self._context
+        self._function = node.name
+        self._globals = frozenset(name for child in ast.walk(node) if isinstance(child, ast.Global)
+                                  for name in child.names)
+        self._context = [{}]
+        self.generic_visit(node)
+        self._function, self._globals, self._context = outer
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_If(self, node):
+        guard = self._guard_from_test(node.test)
+        self.visit(node.test)
+
+        context = dict(self._context[-1])
+        if guard is not None:
+            context[guard[0]] = guard[1]
+        self._context.append(context)
+        for statement in node.body:
+            self.visit(statement)
+        self._context.pop()
+
+        for statement in node.orelse:
+            self.visit(statement)
+
+    def visit_Assign(self, node):
+        for target in node.targets:
+            machine = self._machine_of(target)
+            if machine is not None:
+                self._record(machine, node.value)
+                break
+        self.generic_visit(node)
+
+    def visit_AnnAssign(self, node):
+        machine = self._machine_of(node.target)
+        if node.value is not None and machine is not None:
+            self._record(machine, node.value)
+        self.generic_visit(node)
+
+    def visit_Call(self, node):
+        if _name_of(node.func) in TRANSITION_FUNCTIONS and node.args:
+            # self.transition_to(...) drives the enclosing class's machine
+            func = node.func
+            on_self = (isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name)
+                       and func.value.id == 'self')
+            machine = self._class if on_self and self._class is not None else _MODULE
+            self._record(machine, node.args[0])
+        self.generic_visit(node)
+
+
+def _match_value(match, kind):
+    """Return the identifier or string literal captured for a heuristic kind"""
+    value = match.group(kind)
+    if value is not None:
+        return value if _STATE_IDENTIFIER.fullmatch(value) else None
+    return match.group(kind + '_str')
+
+
+def _scan_heuristics(content):
+    """Scan non-Python source once, returning enum members and ordered events
+
+    Events are ('case', state) for case labels, ('guard', state) for
+    if-guards, ('target', state) for assignments and transition calls, and
+    ('open', kind)/('close', None) for braces, where kind is 'state_switch'
+    for the body of a switch on the state, 'switch' for any other switch and
+    'block' otherwise.
+    """
+    members = set()
+    events = []
+    for match in _HEURISTIC_RE.finditer(content):
+        if match.group('enum') is not None:
+            for member in match.group('members').split(';')[0].split(','):
+                name = member.split('=')[0].split('(')[0].strip()
+                if name:
+                    members.add(name)
+        elif match.group('state_switch') is not None:
+            events.append(('open', 'state_switch'))
+        elif match.group('other_switch') is not None:
+            events.append(('open', 'switch'))
+        elif match.group('open') is not None:
+            events.append(('open', 'block'))
+        elif match.group('close') is not None:
+            events.append(('close', None))
+        else:
+            for kind, event in (('case', 'case'), ('guard', 'guard'), ('assign', 'target'), ('call', 'target')):
+                if match.group(kind) is not None or match.group(kind + '_str') is not None:
+                    value = _match_value(match, kind)
+                    if value is not None:
+                        events.append((event, value))
+                    break
+    return members, events
+
+
+def _heuristic_transitions(scans):
+    """Turn per-file heuristic events into one (initial, edges) pair per file
+
+    A case label is a source only directly inside ``switch (state)``, and an
+    if-guard is a source for the block or statement it guards. Sources are
+    dropped when their block closes, so they never leak into other
+    functions. A file's first unguarded target is taken as its initial
+    state. In files that use members of a State enum, only those members
+    count as states.
+    """
+    known = set()
+    for members, _ in scans:
+        known |= members
+
+    results = []
+    for _, events in scans:
+        uses_enum = any(value in known for event, value in events
+                        if event in ('case', 'guard', 'target'))
+        initial = None
+        edges = []
+        # One [kind, source] entry per open brace, outermost first
+        scopes = [['block', None]]
+        pending_guard = None
+        for event, value in events:
+            if event == 'open':
+                scopes.append([value, pending_guard])
+                pending_guard = None
+                continue
+            if event == 'close':
+                if len(scopes) > 1:
+                    scopes.pop()
+                pending_guard = None
+                continue
+            if uses_enum and value not in known:
+                continue
+
+            if event == 'case':
+                # Labels of switches on anything else (action.type, e.key) are ignored
+                if scopes[-1][0] == 'state_switch':
+                    scopes[-1][1] = value
+            elif event == 'guard':
+                pending_guard = value
+            else:
+                source = pending_guard
+                pending_guard = None
+                for _, scope_source in reversed(scopes):
+                    if source is not None:
+                        break
+                    source = scope_source
+                if source is None:
+                    initial = initial or value
+                elif source != value:
+                    edges.append((source, value))
+        results.append((initial, edges))
+    return results
+
+
+def _state_id(name):
+    """Make a name usable as a Mermaid state id"""
+    return _INVALID_ID_CHARS.sub('_', name).strip('_') or 'state'
+
+
+def _expand(machine):
+    """Expand a machine's 'any state' and 'not in' guards over the states it mentions
+
+    Returns its (source, label, target) edges in first-seen order.
+    """
+    mentioned = machine['mentioned']
+    edges = {}
+    for sources, label, target in machine['transitions']:
+        if sources is None:
+            names = mentioned - {target}
+        elif sources[0] == 'not':
+            names = mentioned - sources[1] - {target}
+        else:
+            names = sources[1]
+        for source in sorted(names):
+            edges.setdefault((source, label, target), None)
+    return list(edges)
+
+
+def _render(machines):
+    """Build the Mermaid diagram for a list of (name, initial, edges) machines
+
+    A single machine is drawn at the top level. Several machines each become
+    a composite state named after their class or file, with prefixed state
+    ids so that same-named states of different machines stay apart. Returns
+    (diagram, state ids).
+    """
+    lines = ['stateDiagram-v2']
+    states = set()
+    composites = set()
+    for name, initial, edges in machines:
+        indent = '    '
+        prefix = ''
+        if len(machines) > 1:
+            composite = _state_id(name)
+            while composite in composites:
+                composite += '_'
+            composites.add(composite)
+            prefix = composite + '_'
+            lines.append(f'    state {composite} {{')
+            indent = '        '
+            names = {initial} if initial else set()
+            for source, _, target in edges:
+                names.update((source, target))
+            for state in sorted(names):
+                lines.append(f'{indent}state "{state}" as {prefix}{_state_id(state)}')
+
+        if initial:
+            lines.append(f'{indent}[*] --> {prefix}{_state_id(initial)}')
+            states.add(prefix + _state_id(initial))
+        for source, label, target in edges:
+            line = f'{indent}{prefix}{_state_id(source)} --> {prefix}{_state_id(target)}'
+            lines.append(f'{line}: {label}' if label else line)
+            states.update((prefix + _state_id(source), prefix + _state_id(target)))
+        if prefix:
+            lines.append('    }')
+    return '\n'.join(lines), states
+
+
+def extract_state_machine(files, min_ast_transitions=0):
+    """Extract state machines locally, without calling Claude
+
+    Python sources get a cheap AST walk. Only when it finds at least
+    ``min_ast_transitions`` state writes under an explicit guard on the
+    current state are other languages scanned, once each, with the combined
+    regex heuristics; each such file is drawn as its own machine. ``files``
+    is a list of ``{'path', 'content'}`` dicts as returned by
+    ``CodeToFSMAnalyzer.read_files``. Returns a dict with the Mermaid
+    ``diagram``, its ``states``, ``transitions`` and the first machine's
+    ``initial`` state, plus ``ast_transitions``, the guarded write count, or
+    None when that count is too low or no state transitions were found.
+    """
+    trees = []
+    others = []
+    for f in files:
+        if not f['path'].endswith('.py'):
+            others.append(f)
+            continue
+        try:
+            # Legacy sources can trigger SyntaxWarnings (e.g. invalid escape
+            # sequences on 3.12+), which would otherwise go to stderr every run
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                trees.append((f['path'], ast.parse(f['content'], filename=f['path'])))
+        except (SyntaxError, ValueError, RecursionError, MemoryError):
+            continue
+
+    # Collect state classes across all files first, so references resolve
+    # regardless of which file defines them
+    state_classes = {}
+    for _, tree in trees:
+        _collect_state_classes(tree, state_classes)
+
+    machines = []
+    ast_transitions = 0
+    for path, tree in trees:
+        visitor = _TransitionVisitor(state_classes)
+        try:
+            visitor.visit(tree)
+        except (RecursionError, MemoryError):
+            # Deeply nested but valid code (e.g. a long chain of '+') can
+            # exceed the recursion limit; only that file is skipped
+            continue
+        for key, machine in visitor.machines.items():
+            edges = _expand(machine)
+            if edges:
+                machines.append((key or path, machine['initial'], edges))
+                # Unguarded writes only say where a machine can go, not from
+                # where, so they don't count as evidence of a state machine
+                ast_transitions += sum(1 for sources, _, _ in machine['transitions'] if sources is not None)
+
+    if ast_transitions < min_ast_transitions:
+        return None
+
+    scans = [_scan_heuristics(f['content']) for f in others]
+    for f, (initial, edges) in zip(others, _heuristic_transitions(scans)):
+        if edges:
+            machines.append((f['path'], initial,
+                             list(dict.fromkeys((source, None, target) for source, target in edges))))
+
+    if not machines:
+        return None
+
+    diagram, states = _render(machines)
+    return {
+        'diagram': diagram,
+        'states': sorted(states),
+        'transitions': sum(len(edges) for _, _, edges in machines),
+        'ast_transitions': ast_transitions,
+        'initial': next((initial for _, initial, _ in machines if initial), None)
+    }
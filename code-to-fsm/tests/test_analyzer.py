@@ -0,0 +1,191 @@
+"""Tests for the workspace scanner and Claude CLI orchestration"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analyzer  # noqa: E402
+from analyzer import CodeToFSMAnalyzer  # noqa: E402
+
+# Stands in for the Claude CLI: fails at once on prompts containing FAILME,
+# otherwise answers with a one-state diagram after a short delay
+_FAKE_CLAUDE = """#!/bin/sh
+input=$(cat)
+case "$input" in
+  *FAILME*) echo "boom" >&2; exit 1;;
+esac
+sleep 0.2
+printf 'ok\\n\\nstateDiagram-v2\\n    [*] --> Reply\\n'
+"""
+
+
+class GlobTest(unittest.TestCase):
+
+    def _matches(self, pattern, path):
+        return analyzer._compile_globs([pattern]).fullmatch(path) is not None
+
+    def test_double_star_matches_any_depth(self):
+        self.assertTrue(self._matches('**/*.py', 'top.py'))
+        self.assertTrue(self._matches('**/*.py', 'a/b/c.py'))
+        self.assertFalse(self._matches('*.py', 'a/b.py'))
+
+    def test_character_classes(self):
+        for path in ('main.c', 'src/util.h'):
+            self.assertTrue(self._matches('**/*.[ch]', path))
+        for path in ('main.cpp', 'main.o', 'a/[ch]'):
+            self.assertFalse(self._matches('**/*.[ch]', path))
+        self.assertTrue(self._matches('v[!0-9].txt', 'vx.txt'))
+        self.assertFalse(self._matches('v[!0-9].txt', 'v1.txt'))
+        # Classes never match the separator, and an unclosed '[' is literal
+        self.assertFalse(self._matches('a[/]b', 'a/b'))
+        self.assertFalse(self._matches('a[!x]b', 'a/b'))
+        self.assertTrue(self._matches('a[b', 'a[b'))
+
+    def test_directory_excludes_match_whole_names(self):
+        self.assertTrue(self._matches('**/build/**', 'build/out.py'))
+        self.assertTrue(self._matches('**/build/**', 'src/build/out.py'))
+        self.assertFalse(self._matches('**/build/**', 'rebuild/out.py'))
+        self.assertFalse(self._matches('**/build/**', 'build.py'))
+
+    def test_split_dir_excludes(self):
+        names, residual = analyzer._split_dir_excludes(
+            ['**/node_modules/**', '**/build/**', '**/*.pyc', 'docs/**', '**/.git/**'])
+        self.assertEqual(names, frozenset({'node_modules', 'build', '.git'}))
+        self.assertEqual(residual, ['**/*.pyc', 'docs/**'])
+
+
+class ScanWorkspaceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.workspace = self.tmp.name
+
+    def _touch(self, *names):
+        for name in names:
+            path = os.path.join(self.workspace, *name.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write('x = 1\n')
+
+    def _scan(self, patterns, excludes=None, workspace=None):
+        options = {'file_patterns': patterns}
+        if excludes is not None:
+            options['exclude_patterns'] = excludes
+        files = CodeToFSMAnalyzer(workspace or self.workspace, options).scan_workspace()
+        return sorted(os.path.relpath(path, workspace or self.workspace).replace(os.sep, '/')
+                      for path in files)
+
+    def test_default_excludes(self):
+        self._touch('app.py', 'rebuild/tool.py', 'build/gen.py', 'src/build/gen.py',
+                    'node_modules/pkg/index.js', 'web/node_modules/pkg/index.js', 'web/main.js')
+        self.assertEqual(self._scan(['**/*.py', '**/*.js']),
+                         ['app.py', 'rebuild/tool.py', 'web/main.js'])
+
+    def test_pruned_directories_are_not_entered(self):
+        self._touch('app.py', 'node_modules/pkg/index.js')
+        fsm = CodeToFSMAnalyzer(self.workspace, {'file_patterns': ['**/*.js']})
+        visited = []
+        real_scandir = os.scandir
+
+        def recording_scandir(path):
+            visited.append(os.path.relpath(path, self.workspace))
+            return real_scandir(path)
+
+        analyzer.os.scandir = recording_scandir
+        self.addCleanup(setattr, analyzer.os, 'scandir', real_scandir)
+        self.assertEqual(list(fsm.scan_workspace()), [])
+        self.assertEqual(visited, ['.'])
+
+    def test_character_class_pattern(self):
+        self._touch('main.c', 'src/util.h', 'src/util.cpp', 'notes.txt')
+        self.assertEqual(self._scan(['**/*.[ch]']), ['main.c', 'src/util.h'])
+
+    @unittest.skipUnless(hasattr(os, 'symlink'), 'needs symlink support')
+    def test_symlinked_files_are_included(self):
+        self._touch('real/robot.py')
+        try:
+            os.symlink(os.path.join(self.workspace, 'real', 'robot.py'),
+                       os.path.join(self.workspace, 'linked.py'))
+            os.symlink(os.path.join(self.workspace, 'real'), os.path.join(self.workspace, 'alias'))
+        except (OSError, NotImplementedError):
+            self.skipTest('symlinks not permitted')
+        # Symlinked files count; symlinked directories are not descended into
+        self.assertEqual(self._scan(['**/*.py']), ['linked.py', 'real/robot.py'])
+
+    def test_overlapping_patterns_yield_each_file_once(self):
+        self._touch('top.py', 'pkg/mod.py')
+        patterns = ['top.py', '*.py', 'pkg/*.py', '**/*.py']
+        self.assertEqual(self._scan(patterns), ['pkg/mod.py', 'top.py'])
+
+        # An unnormalized workspace path must not defeat the dedupe
+        cwd = os.getcwd()
+        os.chdir(self.workspace)
+        self.addCleanup(os.chdir, cwd)
+        self.assertEqual(self._scan(patterns, workspace='.'), ['pkg/mod.py', 'top.py'])
+
+
+class PromptTest(unittest.TestCase):
+
+    def test_undecodable_path_is_escaped(self):
+        fsm = CodeToFSMAnalyzer('.')
+        prompt = fsm.create_analysis_prompt([{'path': 'bad\udcff.py', 'content': 'caf\u00e9'}])
+        prompt.encode('utf-8')
+        self.assertIn('bad\\udcff.py', prompt)
+
+    def test_non_ascii_stays_readable(self):
+        fsm = CodeToFSMAnalyzer('.')
+        prompt = fsm.create_analysis_prompt([{'path': 'caf\u00e9.py', 'content': 'state = "\u00e9t\u00e9"'}])
+        self.assertIn('caf\u00e9.py', prompt)
+        self.assertIn('\u00e9t\u00e9', prompt)
+
+
+@unittest.skipIf(os.name == 'nt', 'fake CLI is a shell script')
+class ChunkedAnalysisTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        fake = os.path.join(self.tmp.name, 'claude')
+        with open(fake, 'w') as f:
+            f.write(_FAKE_CLAUDE)
+        os.chmod(fake, 0o755)
+        original = analyzer._CLAUDE_BIN
+        analyzer._CLAUDE_BIN = fake
+        self.addCleanup(setattr, analyzer, '_CLAUDE_BIN', original)
+
+        self.workspace = os.path.join(self.tmp.name, 'ws')
+        os.mkdir(self.workspace)
+
+    def _write(self, name, content):
+        with open(os.path.join(self.workspace, name), 'w') as f:
+            f.write(content)
+
+    def _analyze(self):
+        # A tiny prompt budget puts every file in its own chunk
+        fsm = CodeToFSMAnalyzer(self.workspace, {'use_cache': False, 'max_prompt_chars': 10})
+        with contextlib.redirect_stdout(io.StringIO()):
+            return fsm.analyze()
+
+    def test_failed_chunk_keeps_the_others(self):
+        self._write('a.py', 'x = 1\n')
+        self._write('b.py', 'x = 2\n')
+        self._write('c.py', '# FAILME\n')
+        results = self._analyze()
+        self.assertIn('[*] --> Reply', results['mermaid_diagram'])
+        self.assertEqual(results['analysis'].count('--- Part '), 2)
+
+    def test_every_chunk_failing_raises(self):
+        self._write('a.py', '# FAILME\n')
+        self._write('b.py', '# FAILME\n')
+        with self.assertRaisesRegex(Exception, 'boom'):
+            self._analyze()
+
+
+if __name__ == '__main__':
+    unittest.main()
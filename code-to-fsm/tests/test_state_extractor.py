@@ -0,0 +1,362 @@
+"""Tests for the local state machine extractor"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzer import CodeToFSMAnalyzer  # noqa: E402
+from state_extractor import extract_state_machine  # noqa: E402
+
+
+def _edges(result):
+    """Return the diagram's (source, target) pairs, without the initial arrow"""
+    edges = set()
+    for line in result['diagram'].splitlines()[1:]:
+        source, arrow, target = line.split(':')[0].strip().partition(' --> ')
+        if arrow and source != '[*]':
+            edges.add((source, target))
+    return edges
+
+
+class PythonExtractionTest(unittest.TestCase):
+
+    def test_guarded_assignments(self):
+        content = (
+            "class RobotState:\n"
+            "    IDLE = 'idle'\n"
+            "    MOVING = 'moving'\n"
+            "    ERROR = 'error'\n"
+            "\n"
+            "class Robot:\n"
+            "    def __init__(self):\n"
+            "        self.state = RobotState.IDLE\n"
+            "\n"
+            "    def start(self):\n"
+            "        if self.state == RobotState.IDLE:\n"
+            "            self.state = RobotState.MOVING\n"
+            "\n"
+            "    def fail(self):\n"
+            "        if self.state == RobotState.MOVING:\n"
+            "            self.state = RobotState.ERROR\n"
+            "\n"
+            "    def reset(self):\n"
+            "        if self.state == RobotState.ERROR:\n"
+            "            self.state = RobotState.IDLE\n"
+        )
+        result = extract_state_machine([{'path': 'robot.py', 'content': content}])
+        self.assertEqual(result['ast_transitions'], 3)
+        self.assertEqual(result['transitions'], 3)
+        self.assertEqual(result['initial'], 'IDLE')
+
+    def test_enum_states_and_transition_calls(self):
+        content = (
+            "from enum import Enum, auto\n"
+            "\n"
+            "class Phase(Enum):\n"
+            "    IDLE = auto()\n"
+            "    RUNNING = auto()\n"
+            "    DONE = auto()\n"
+            "\n"
+            "class Worker:\n"
+            "    def __init__(self):\n"
+            "        self.state = Phase.IDLE\n"
+            "\n"
+            "    def run(self):\n"
+            "        if self.state is Phase.IDLE:\n"
+            "            self.transition_to(Phase.RUNNING)\n"
+            "\n"
+            "    def finish(self):\n"
+            "        if Phase.RUNNING == self.state:\n"
+            "            self.transition_to(Phase.DONE)\n"
+            "\n"
+            "    def transition_to(self, new_state):\n"
+            "        self.state = new_state\n"
+        )
+        result = extract_state_machine([{'path': 'worker.py', 'content': content}])
+        self.assertEqual(_edges(result), {('IDLE', 'RUNNING'), ('RUNNING', 'DONE')})
+        self.assertEqual(result['initial'], 'IDLE')
+        self.assertEqual(result['ast_transitions'], 2)
+
+    def test_in_not_equal_and_or_guards(self):
+        content = (
+            "class Pump:\n"
+            "    def __init__(self):\n"
+            "        self.state = 'OFF'\n"
+            "\n"
+            "    def start(self):\n"
+            "        if self.state == 'OFF' or self.state == 'PAUSED':\n"
+            "            self.state = 'ON'\n"
+            "\n"
+            "    def pause(self):\n"
+            "        if self.state in ('ON',):\n"
+            "            self.state = 'PAUSED'\n"
+            "\n"
+            "    def fault(self):\n"
+            "        if self.state != 'OFF':\n"
+            "            self.state = 'FAULT'\n"
+        )
+        result = extract_state_machine([{'path': 'pump.py', 'content': content}])
+        self.assertEqual(_edges(result), {
+            ('OFF', 'ON'), ('PAUSED', 'ON'), ('ON', 'PAUSED'),
+            ('ON', 'FAULT'), ('PAUSED', 'FAULT'),
+        })
+        self.assertEqual(result['ast_transitions'], 3)
+
+    def test_unguarded_write_comes_from_any_state(self):
+        content = (
+            "class Valve:\n"
+            "    def __init__(self):\n"
+            "        self.state = 'CLOSED'\n"
+            "\n"
+            "    def open(self):\n"
+            "        if self.state == 'CLOSED':\n"
+            "            self.state = 'OPEN'\n"
+            "\n"
+            "    def emergency_stop(self):\n"
+            "        self.state = 'LOCKED'\n"
+        )
+        result = extract_state_machine([{'path': 'valve.py', 'content': content}])
+        self.assertEqual(_edges(result), {('CLOSED', 'OPEN'), ('CLOSED', 'LOCKED'), ('OPEN', 'LOCKED')})
+        self.assertEqual(result['transitions'], 3)
+        self.assertEqual(result['ast_transitions'], 1)
+
+    def test_classes_are_separate_machines(self):
+        content = (
+            "class Door:\n"
+            "    def open(self):\n"
+            "        self.state = 'open'\n"
+            "    def close(self):\n"
+            "        self.state = 'closed'\n"
+            "\n"
+            "class Job:\n"
+            "    def start(self):\n"
+            "        self.state = 'running'\n"
+            "    def finish(self):\n"
+            "        self.state = 'done'\n"
+        )
+        result = extract_state_machine([{'path': 'misc.py', 'content': content}])
+        # Each class is drawn as its own composite state, never linked to the other
+        self.assertEqual(_edges(result), {('Door_closed', 'Door_open'), ('Door_open', 'Door_closed'),
+                                          ('Job_done', 'Job_running'), ('Job_running', 'Job_done')})
+        # Unguarded writes don't count towards the skip-Claude threshold
+        self.assertEqual(result['ast_transitions'], 0)
+
+    def test_function_locals_are_not_states(self):
+        content = (
+            "def ship_to_california():\n"
+            "    state = 'CA'\n"
+            "    return state\n"
+            "\n"
+            "def ship_to_new_york():\n"
+            "    state = 'NY'\n"
+            "\n"
+            "def ship_to_texas():\n"
+            "    state = 'TX'\n"
+        )
+        self.assertIsNone(extract_state_machine([{'path': 'shipping.py', 'content': content}]))
+
+    def test_module_state_written_through_global(self):
+        content = (
+            "state = 'OFF'\n"
+            "\n"
+            "def toggle():\n"
+            "    global state\n"
+            "    if state == 'OFF':\n"
+            "        state = 'ON'\n"
+            "    elif state == 'ON':\n"
+            "        state = 'OFF'\n"
+        )
+        result = extract_state_machine([{'path': 'switch.py', 'content': content}])
+        self.assertEqual(_edges(result), {('OFF', 'ON'), ('ON', 'OFF')})
+        self.assertEqual(result['initial'], 'OFF')
+        self.assertEqual(result['ast_transitions'], 2)
+
+    def test_deeply_nested_file_is_skipped(self):
+        deep = "x = " + " + ".join(["'a'"] * 900) + "\n"
+        content = (
+            "class Lamp:\n"
+            "    def toggle(self):\n"
+            "        if self.state == 'OFF':\n"
+            "            self.state = 'ON'\n"
+        )
+        result = extract_state_machine([{'path': 'deep.py', 'content': deep},
+                                        {'path': 'lamp.py', 'content': content}])
+        self.assertEqual(_edges(result), {('OFF', 'ON')})
+
+    def test_parse_warnings_are_silenced(self):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            extract_state_machine([{'path': 'legacy.py', 'content': "pattern = '\\d+'\n"}])
+        self.assertEqual(caught, [])
+
+
+class HeuristicExtractionTest(unittest.TestCase):
+
+    def test_switch_on_state(self):
+        content = (
+            "enum RobotState { Idle, Moving, Error }\n"
+            "class Robot {\n"
+            "  private state = RobotState.Idle;\n"
+            "  tick(event: string) {\n"
+            "    switch (this.state) {\n"
+            "      case RobotState.Idle:\n"
+            "        if (event === 'go') { this.state = RobotState.Moving; }\n"
+            "        break;\n"
+            "      case RobotState.Moving:\n"
+            "        this.state = RobotState.Error;\n"
+            "        break;\n"
+            "    }\n"
+            "  }\n"
+            "}\n"
+        )
+        result = extract_state_machine([{'path': 'robot.ts', 'content': content}])
+        self.assertEqual(_edges(result), {('Idle', 'Moving'), ('Moving', 'Error')})
+        self.assertEqual(result['initial'], 'Idle')
+
+    def test_if_guard_in_c(self):
+        content = (
+            "void step(void) {\n"
+            "    if (state == IDLE) {\n"
+            "        state = RUNNING;\n"
+            "    }\n"
+            "    if (state == RUNNING)\n"
+            "        state = STOPPED;\n"
+            "}\n"
+        )
+        result = extract_state_machine([{'path': 'm.c', 'content': content}])
+        self.assertEqual(_edges(result), {('IDLE', 'RUNNING'), ('RUNNING', 'STOPPED')})
+
+    def test_unrelated_switches_are_not_sources(self):
+        content = (
+            "function reducer(state, action) {\n"
+            "  switch (action.type) {\n"
+            "    case 'ADD_TODO':\n"
+            "      return state;\n"
+            "  }\n"
+            "}\n"
+            "function onKey(e) {\n"
+            "  switch (e.key) {\n"
+            "    case 'Escape':\n"
+            "      close();\n"
+            "  }\n"
+            "}\n"
+            "function load() { state = 'loading'; }\n"
+            "function done() { state = 'ready'; }\n"
+            "function fail() { state = 'error'; }\n"
+            "class View { finish() { this.setState('Done'); } }\n"
+        )
+        result = extract_state_machine([{'path': 'app.js', 'content': content}])
+        self.assertIsNone(result)
+
+    def test_guard_does_not_leak_past_its_block(self):
+        content = (
+            "function a() {\n"
+            "  if (state === 'idle') { start(); }\n"
+            "}\n"
+            "function b() { state = 'busy'; }\n"
+        )
+        self.assertIsNone(extract_state_machine([{'path': 'x.js', 'content': content}]))
+
+    def test_heuristics_never_count_as_ast_transitions(self):
+        content = (
+            "void step(void) {\n"
+            "    switch (state) {\n"
+            "    case IDLE: state = A; break;\n"
+            "    case A: state = B; break;\n"
+            "    case B: state = C; break;\n"
+            "    case C: state = IDLE; break;\n"
+            "    }\n"
+            "}\n"
+        )
+        files = [{'path': 'm.c', 'content': content}]
+        result = extract_state_machine(files)
+        self.assertEqual(result['transitions'], 4)
+        self.assertEqual(result['ast_transitions'], 0)
+        # Without enough guarded Python transitions the heuristics don't run at all
+        self.assertIsNone(extract_state_machine(files, 1))
+
+    def test_heuristic_states_stay_in_their_own_file(self):
+        python = (
+            "class Robot:\n"
+            "    def __init__(self):\n"
+            "        self.state = 'Idle'\n"
+            "\n"
+            "    def go(self):\n"
+            "        if self.state == 'Idle':\n"
+            "            self.state = 'Moving'\n"
+        )
+        javascript = (
+            "let state = 'Ready';\n"
+            "function submit() {\n"
+            "  if (state === 'Idle') { state = 'Busy'; }\n"
+            "}\n"
+        )
+        result = extract_state_machine([{'path': 'robot.py', 'content': python},
+                                        {'path': 'ui.js', 'content': javascript}], 1)
+        self.assertEqual(_edges(result), {('Robot_Idle', 'Robot_Moving'), ('ui_js_Idle', 'ui_js_Busy')})
+        # The Python machine's initial state wins over the other file's
+        self.assertEqual(result['initial'], 'Idle')
+        self.assertIn('[*] --> Robot_Idle', result['diagram'])
+
+
+class FastPathThresholdTest(unittest.TestCase):
+
+    def _analyze(self, sources):
+        with tempfile.TemporaryDirectory() as workspace:
+            for name, content in sources.items():
+                with open(os.path.join(workspace, name), 'w', encoding='utf-8') as f:
+                    f.write(content)
+            analyzer = CodeToFSMAnalyzer(workspace, {'use_cache': False})
+            calls = []
+
+            def fake_claude(files, focus_area):
+                calls.append([f['path'] for f in files])
+                response = 'stateDiagram-v2\n    [*] --> FromClaude'
+                return [response], response
+
+            analyzer._analyze_with_chunks = fake_claude
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = analyzer.analyze()
+            return results, calls
+
+    def test_guarded_machine_skips_claude(self):
+        content = (
+            "class Light:\n"
+            "    def __init__(self):\n"
+            "        self.state = 'RED'\n"
+            "\n"
+            "    def tick(self):\n"
+            "        if self.state == 'RED':\n"
+            "            self.state = 'GREEN'\n"
+            "        elif self.state == 'GREEN':\n"
+            "            self.state = 'YELLOW'\n"
+            "        elif self.state == 'YELLOW':\n"
+            "            self.state = 'RED'\n"
+        )
+        results, calls = self._analyze({'light.py': content})
+        self.assertEqual(calls, [])
+        self.assertIn('RED --> GREEN: tick', results['mermaid_diagram'])
+
+    def test_unguarded_writes_go_to_claude(self):
+        content = (
+            "class Door:\n"
+            "    def open(self):\n"
+            "        self.state = 'open'\n"
+            "    def close(self):\n"
+            "        self.state = 'closed'\n"
+            "    def lock(self):\n"
+            "        self.state = 'locked'\n"
+        )
+        results, calls = self._analyze({'door.py': content})
+        self.assertEqual(calls, [['door.py']])
+        self.assertIn('FromClaude', results['mermaid_diagram'])
+
+
+if __name__ == '__main__':
+    unittest.main()